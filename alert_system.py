@@ -4,46 +4,16 @@ Sends email notifications for high-risk customers
 """
 
 import smtplib
+import heapq
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 import json
 
 
-class AlertSystem:
-    """Handles sending alerts for at-risk customers"""
-    
-    def __init__(self, email_from=None, email_password=None):
-        """
-        Initialize alert system
-        
-        Args:
-            email_from: Sender email address (Gmail recommended)
-            email_password: Email password or app password
-        """
-        self.email_from = email_from
-        self.email_password = email_password
-    
-    def format_currency(self, value):
-        """Format currency as £X,XXX"""
-        return f"£{value:,.0f}"
-    
-    def create_alert_email_body(self, high_risk_customers):
-        """Create HTML email body for alert"""
-        
-        # Sort by CLV (highest value at risk first)
-        sorted_customers = sorted(
-            high_risk_customers,
-            key=lambda x: x.get('clv', 0),
-            reverse=True
-        )[:5]  # Top 5 customers
-        
-        # Calculate totals
-        total_at_risk = sum([c.get('clv', 0) for c in high_risk_customers])
-        total_discount_cost = sum([c.get('discount_cost', 0) for c in high_risk_customers])
-        
-        # HTML Email Template
-        html_body = f"""
+# Static parts of the HTML alert email, built once at import time; only the
+# summary figures and the per-customer rows change between alerts
+_HEAD_TEMPLATE = """
         <html>
         <head>
             <style>
@@ -63,44 +33,34 @@ class AlertSystem:
             <div class="container">
                 <div class="header">
                     <h1>🚨 CHURN ALERT - IMMEDIATE ACTION REQUIRED</h1>
-                    <p>{datetime.now().strftime('%A, %B %d, %Y')}</p>
+                    <p>{date}</p>
                 </div>
                 
-                <h2>⏰ {len(high_risk_customers)} High-Risk Customers Detected</h2>
+                <h2>⏰ {count} High-Risk Customers Detected</h2>
                 <p>Below are the customers at highest risk of churning, prioritized by revenue impact:</p>
                 
                 <div class="summary">
                     <h3>📊 SUMMARY</h3>
                     <div class="metric">
                         <div class="metric-label">Customers at Risk</div>
-                        <div class="metric-value">{len(high_risk_customers)}</div>
+                        <div class="metric-value">{count}</div>
                     </div>
                     <div class="metric">
                         <div class="metric-label">Total Revenue at Risk</div>
-                        <div class="metric-value">{self.format_currency(total_at_risk)}</div>
+                        <div class="metric-value">{total_at_risk}</div>
                     </div>
                     <div class="metric">
                         <div class="metric-label">Investment to Save</div>
-                        <div class="metric-value">{self.format_currency(total_discount_cost)}</div>
+                        <div class="metric-value">{total_discount_cost}</div>
                     </div>
                 </div>
                 
                 <h3>🔴 TOP AT-RISK CUSTOMERS</h3>
         """
-        
-        # Add each customer
-        for idx, customer in enumerate(sorted_customers, 1):
-            days_until = customer.get('days_until_churn', '?')
-            churn_date = customer.get('predicted_churn_date', 'Unknown')
-            clv = self.format_currency(customer.get('clv', 0))
-            risk_score = customer.get('churn_risk_score', 0)
-            discount = customer.get('recommended_discount_pct', 0)
-            action = customer.get('action', 'Monitor')
-            priority = customer.get('priority', 'Medium')
-            
-            html_body += f"""
+
+_CUSTOMER_TEMPLATE = """
                 <div class="customer">
-                    <h4>{idx}. {customer['customer_id']} - Priority: <strong>{priority}</strong></h4>
+                    <h4>{idx}. {customer_id} - Priority: <strong>{priority}</strong></h4>
                     
                     <div class="metric">
                         <div class="metric-label">⏰ Churn In</div>
@@ -126,20 +86,18 @@ class AlertSystem:
                     </div>
                 </div>
             """
-        
-        # Footer with recommendations
-        html_body += f"""
+
+_ACTIONS_HEADER = """
                 <h3>✅ RECOMMENDED ACTIONS (By Priority)</h3>
                 <ol>
         """
-        
-        for idx, customer in enumerate(sorted_customers, 1):
-            html_body += f"""
-                    <li><strong>{customer['customer_id']}</strong> - {customer.get('action', 'Monitor')} 
-                        (Save {self.format_currency(customer.get('clv', 0))})</li>
+
+_ACTION_ITEM_TEMPLATE = """
+                    <li><strong>{customer_id}</strong> - {action} 
+                        (Save {clv})</li>
             """
-        
-        html_body += """
+
+_FOOTER_TEMPLATE = """
                 </ol>
                 
                 <div class="footer">
@@ -147,40 +105,133 @@ class AlertSystem:
                     <p>Log in to the dashboard for full details: 
                     <a href="https://share.streamlit.io/ROSI9979/supplier-churn-detection">
                     Churn Detection Dashboard</a></p>
-                    <p>Alert sent: """ + datetime.now().strftime('%Y-%m-%d %H:%M:%S') + """</p>
+                    <p>Alert sent: {timestamp}</p>
                 </div>
             </div>
         </body>
         </html>
         """
+
+
+class AlertSystem:
+    """Handles sending alerts for at-risk customers"""
+    
+    def __init__(self, email_from=None, email_password=None):
+        """
+        Initialize alert system
+        
+        Args:
+            email_from: Sender email address (Gmail recommended)
+            email_password: Email password or app password
+        """
+        self.email_from = email_from
+        self.email_password = email_password
+        self._smtp = None
+    
+    def _get_smtp(self):
+        """Return the Gmail SMTP connection, opening and logging in only on first use"""
+        
+        if self._smtp is not None:
+            try:
+                # Keep-alive check; reconnect below if the server dropped us
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._smtp = None
+        
+        if self._smtp is None:
+            server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
+            server.login(self.email_from, self.email_password)
+            self._smtp = server
         
-        return html_body
+        return self._smtp
     
-    def create_alert_text_body(self, high_risk_customers):
-        """Create plain text email body for alert"""
+    def close(self):
+        """Close the SMTP connection if one is open"""
+        if self._smtp:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+    
+    def format_currency(self, value):
+        """Format currency as £X,XXX"""
+        return f"£{value:,.0f}"
+    
+    def _prepare_alert_context(self, high_risk_customers):
+        """Rank and total the high-risk customers once for every alert format"""
+        
+        now = datetime.now()
+        
+        return {
+            # Top 5 by CLV (highest value at risk first)
+            'top5': heapq.nlargest(5, high_risk_customers, key=lambda x: x.get('clv', 0)),
+            'total_at_risk': sum(c.get('clv', 0) for c in high_risk_customers),
+            'total_discount_cost': sum(c.get('discount_cost', 0) for c in high_risk_customers),
+            'date_header': now.strftime('%A, %B %d, %Y'),
+            'timestamp': now.strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    def create_alert_email_body(self, high_risk_customers, context=None):
+        """Create HTML email body for alert"""
+        
+        if context is None:
+            context = self._prepare_alert_context(high_risk_customers)
         
-        sorted_customers = sorted(
-            high_risk_customers,
-            key=lambda x: x.get('clv', 0),
-            reverse=True
-        )[:5]
+        # Build customer rows and recommended actions in a single pass
+        customer_rows = []
+        action_items = []
+        for idx, customer in enumerate(context['top5'], 1):
+            clv = self.format_currency(customer.get('clv', 0))
+            action = customer.get('action', 'Monitor')
+            
+            customer_rows.append(_CUSTOMER_TEMPLATE.format(
+                idx=idx,
+                customer_id=customer['customer_id'],
+                priority=customer.get('priority', 'Medium'),
+                days_until=customer.get('days_until_churn', '?'),
+                churn_date=customer.get('predicted_churn_date', 'Unknown'),
+                clv=clv,
+                risk_score=customer.get('churn_risk_score', 0),
+                action=action,
+                discount=customer.get('recommended_discount_pct', 0)
+            ))
+            action_items.append(_ACTION_ITEM_TEMPLATE.format(
+                customer_id=customer['customer_id'],
+                action=action,
+                clv=clv
+            ))
+        
+        head = _HEAD_TEMPLATE.format(
+            date=context['date_header'],
+            count=len(high_risk_customers),
+            total_at_risk=self.format_currency(context['total_at_risk']),
+            total_discount_cost=self.format_currency(context['total_discount_cost'])
+        )
+        footer = _FOOTER_TEMPLATE.format(timestamp=context['timestamp'])
+        
+        return "".join([head] + customer_rows + [_ACTIONS_HEADER] + action_items + [footer])
+    
+    def create_alert_text_body(self, high_risk_customers, context=None):
+        """Create plain text email body for alert"""
         
-        total_at_risk = sum([c.get('clv', 0) for c in high_risk_customers])
+        if context is None:
+            context = self._prepare_alert_context(high_risk_customers)
         
         text_body = f"""
 CHURN ALERT - IMMEDIATE ACTION REQUIRED
-{datetime.now().strftime('%A, %B %d, %Y')}
+{context['date_header']}
 
 SUMMARY
 =======
 Customers at Risk: {len(high_risk_customers)}
-Total Revenue at Risk: {self.format_currency(total_at_risk)}
+Total Revenue at Risk: {self.format_currency(context['total_at_risk'])}
 
 TOP AT-RISK CUSTOMERS (by revenue impact)
 ==========================================
 """
         
-        for idx, customer in enumerate(sorted_customers, 1):
+        for idx, customer in enumerate(context['top5'], 1):
             days_until = customer.get('days_until_churn', '?')
             churn_date = customer.get('predicted_churn_date', 'Unknown')
             clv = self.format_currency(customer.get('clv', 0))
@@ -227,47 +278,70 @@ This is an automated alert from Supplier Churn Detection System
             print("✓ No high-risk customers to alert")
             return True
         
-        # Create email
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🚨 URGENT: {len(high_risk_customers)} Customers at Risk"
-        msg['From'] = self.email_from or "churn-alerts@system.local"
-        msg['To'] = recipient_email
-        
-        # Create email body
-        text_body = self.create_alert_text_body(high_risk_customers)
-        html_body = self.create_alert_email_body(high_risk_customers)
+        subject = f"🚨 URGENT: {len(high_risk_customers)} Customers at Risk"
         
-        # Attach both plain text and HTML versions
-        part1 = MIMEText(text_body, 'plain')
-        part2 = MIMEText(html_body, 'html')
-        
-        msg.attach(part1)
-        msg.attach(part2)
+        # Create email body (rank and total the customers once for both versions)
+        context = self._prepare_alert_context(high_risk_customers)
+        text_body = self.create_alert_text_body(high_risk_customers, context)
         
         if use_gmail and self.email_from and self.email_password:
+            # The HTML version and MIME message are only needed when actually sending
+            html_body = self.create_alert_email_body(high_risk_customers, context)
+            
+            # Create email
+            msg = MIMEMultipart('alternative')
+            msg['Subject'] = subject
+            msg['From'] = self.email_from
+            msg['To'] = recipient_email
+            
+            # Attach both plain text and HTML versions
+            part1 = MIMEText(text_body, 'plain')
+            part2 = MIMEText(html_body, 'html')
+            
+            msg.attach(part1)
+            msg.attach(part2)
+            
             try:
-                # Send via Gmail
-                server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-                server.login(self.email_from, self.email_password)
-                server.send_message(msg)
-                server.quit()
+                # Send via Gmail, reusing the open connection across alerts
+                self._get_smtp().send_message(msg)
                 
                 print(f"✓ Email alert sent to {recipient_email}")
                 return True
             except Exception as e:
                 print(f"✗ Failed to send email: {e}")
+                self.close()
                 return False
         else:
             # Just print to console (for testing without email setup)
             print(f"\n{'='*80}")
             print(f"EMAIL ALERT (Would be sent to: {recipient_email})")
             print(f"{'='*80}")
-            print(f"Subject: {msg['Subject']}")
+            print(f"Subject: {subject}")
             print(f"{'='*80}")
             print(text_body)
             print(f"{'='*80}\n")
             return True
     
+    def send_email_alerts_batch(self, customers_by_recipient, use_gmail=False):
+        """
+        Send one alert per recipient over a single SMTP connection
+        
+        Args:
+            customers_by_recipient: Dict of recipient email -> list of high-risk customer data
+            use_gmail: True for Gmail SMTP, False for console printing (testing)
+        
+        Returns:
+            Dict of recipient email -> True if the alert was sent
+        """
+        
+        try:
+            return {
+                recipient: self.send_email_alert(recipient, customers, use_gmail=use_gmail)
+                for recipient, customers in customers_by_recipient.items()
+            }
+        finally:
+            self.close()
+    
     def print_alert_summary(self, high_risk_customers):
         """Print alert summary to console"""
         
@@ -275,13 +349,10 @@ This is an automated alert from Supplier Churn Detection System
             print("✓ No high-risk customers")
             return
         
-        sorted_customers = sorted(
-            high_risk_customers,
-            key=lambda x: x.get('clv', 0),
-            reverse=True
-        )
+        # Only the top 5 are printed, so avoid sorting the whole list
+        top_customers = heapq.nlargest(5, high_risk_customers, key=lambda x: x.get('clv', 0))
         
-        total_at_risk = sum([c.get('clv', 0) for c in high_risk_customers])
+        total_at_risk = sum(c.get('clv', 0) for c in high_risk_customers)
         
         print("\n" + "="*80)
         print("🚨 CHURN ALERTS")
@@ -292,7 +363,7 @@ This is an automated alert from Supplier Churn Detection System
         print("Top Customers (by revenue impact):")
         print("-"*80)
         
-        for idx, customer in enumerate(sorted_customers[:5], 1):
+        for idx, customer in enumerate(top_customers, 1):
             days = customer.get('days_until_churn', '?')
             clv = self.format_currency(customer.get('clv', 0))
             risk = customer.get('churn_risk_score', 0)
@@ -1,16 +1,275 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
+import os
 from datetime import datetime
-import plotly.express as px
+import plotly.graph_objects as go
+
+try:
+    import orjson  # Optional: faster report parsing
+except ImportError:
+    orjson = None
+
+# "Sort by" option -> (column, ascending)
+SORT_COLUMNS = {
+    "Revenue": ('clv', False),
+    "Risk Score": ('churn_risk_score', False),
+    "Days Until Churn": ('days_until_churn', True),
+}
+
+PRODUCTS = ['Cheese Dips', 'Chicken Dips', 'Drinks', 'Sauces', 'Frozen Items']
+
+# The products-at-risk badge row is the same for every customer, so build it once
+PRODUCT_GRID_HTML = "<div class='badge-row'>" + "".join(
+    f"<div class='product-badge'><p class='product-name'>📦 {product}</p><p class='at-risk'>AT RISK</p></div>"
+    for product in PRODUCTS
+) + "</div>"
+
+# Fallbacks for card fields an older report may not carry
+CARD_DEFAULTS = {
+    'business_type': 'Unknown', 'region': 'Unknown', 'clv': 0, 'days_until_churn': '?',
+    'purchase_cycle': 30, 'retention_roi': 0, 'predicted_churn_date': 'N/A', 'spending_trend': 0,
+    'recommended_discount_pct': 0, 'action': 'Monitor',
+}
+
+# Narrowed dtypes for the high-risk customers frame (clv keeps its inferred type so values are never rounded)
+HIGH_RISK_DTYPES = {
+    'risk_level': 'category', 'action': 'category', 'region': 'category', 'business_type': 'category',
+    'churn_risk_score': 'float32',
+    'annual_spending': 'Int32', 'retention_roi': 'Int32',
+    'days_until_churn': 'Int16', 'purchase_cycle': 'Int16', 'recommended_discount_pct': 'Int8',
+}
+
+# Card tiers by churn risk score: below 75 medium, 75-85 high, 85+ critical
+RISK_TIER_BOUNDS = [75, 85]
+RISK_TIER_CLASSES = np.array(['medium', 'high', 'critical'])
+RISK_TIER_LABELS = {'critical': "🔴 CRITICAL", 'high': "🟠 HIGH", 'medium': "🟡 MEDIUM"}
+
+@st.cache_resource
+def load_css(path):
+    """Read the dashboard stylesheet once per server process"""
+    with open(path) as f:
+        return f.read()
 
 st.set_page_config(page_title="Churn Detection Dashboard", page_icon="🎯", layout="wide")
 
-st.markdown("<style>h1 { color: #1e40af; font-size: 2.5rem; font-weight: 700; }h2 { color: #1e40af; font-size: 1.8rem; border-bottom: 3px solid #3b82f6; padding-bottom: 0.5rem; }</style>", unsafe_allow_html=True)
+st.html(f"<style>{load_css('style.css')}</style>")
+
+@st.cache_data
+def load_report(path, mtime):
+    """Load the churn report once per file version (mtime keys the cache so a regenerated report is picked up)"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if orjson:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN values written by json.dump, which orjson rejects
+    return json.loads(raw)
+
+def fits_int_dtype(values, dtype):
+    """True if a numeric column is whole-valued and within range of the (nullable) integer dtype"""
+    if not pd.api.types.is_numeric_dtype(values):
+        return False
+    present = values.dropna()
+    info = np.iinfo(dtype.lower())
+    return bool(((present % 1 == 0) & present.between(info.min, info.max)).all())
+
+@st.cache_data
+def load_high_risk_df(path, mtime):
+    """Build the high-risk customers DataFrame once per report version instead of on every rerun"""
+    df = pd.DataFrame(load_report(path, mtime)['high_risk_customers'])
+    if 'recommended_discount_pct' in df:
+        # Written as text in the report; the strategies table formats it as a number
+        df['recommended_discount_pct'] = pd.to_numeric(df['recommended_discount_pct'], errors='coerce')
+    # Narrow the inferred object/64-bit columns so every sort, filter and chart works on less memory.
+    # Only columns the report carries are cast, so older reports still fall back to CARD_DEFAULTS
+    for col, dtype in HIGH_RISK_DTYPES.items():
+        if col not in df:
+            continue
+        if dtype == 'category' or dtype.startswith('float'):
+            df[col] = df[col].astype(dtype)
+        elif fits_int_dtype(df[col], dtype):
+            df[col] = df[col].astype(dtype)
+    # Presorted by risk once per report, so each risk band in apply_filter_sort is a contiguous slice
+    return df.sort_values('churn_risk_score', ascending=False, kind='stable', ignore_index=True)
+
+@st.cache_data
+def apply_filter_sort(high_risk_df, risk_filter, sort_by):
+    """Filter and sort the high-risk customers, cached per selection so unrelated widget changes skip the work"""
+    if "Critical" in risk_filter or "High" in risk_filter:
+        # high_risk_df arrives sorted by score, so each risk band is a contiguous slice;
+        # locate its bounds with a binary search instead of masking every row
+        neg_scores = -high_risk_df['churn_risk_score'].to_numpy()
+        below_70, below_50 = np.searchsorted(neg_scores, [-70, -50], side='right')
+        if "Critical" in risk_filter:
+            filtered_df = high_risk_df.iloc[:below_70]
+        else:
+            filtered_df = high_risk_df.iloc[below_70:below_50]
+    else:
+        filtered_df = high_risk_df
+    
+    column, ascending = SORT_COLUMNS[sort_by]
+    return filtered_df.sort_values(column, ascending=ascending, kind='stable')
+
+@st.cache_data
+def build_analytics_figures(filtered_df):
+    """Build the Analytics tab charts, cached on the filtered data so unrelated reruns reuse them"""
+    # graph_objects traces straight from the column arrays, skipping plotly.express's long-form conversion;
+    # the histogram is binned here so the figure carries 15 bar heights rather than every score
+    # (null scores are left out, as px.histogram did; with no scores at all the chart is simply empty)
+    scores = filtered_df['churn_risk_score'].dropna().to_numpy()
+    if scores.size:
+        counts, edges = np.histogram(scores, bins=15)
+    else:
+        counts, edges = np.array([], dtype=int), np.array([0.0])
+    fig1 = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), marker_color='#3b82f6'))
+    fig1.update_layout(showlegend=False, height=350, xaxis_title='churn_risk_score', yaxis_title='count', uirevision='const')
+    
+    top_10 = filtered_df.nlargest(10, 'clv')
+    fig2 = go.Figure(go.Bar(
+        x=top_10['clv'].to_numpy(), y=top_10['customer_id'].to_numpy(), orientation='h',
+        marker=dict(color=top_10['churn_risk_score'].to_numpy(), colorscale='Reds', colorbar=dict(title='churn_risk_score'))
+    ))
+    fig2.update_layout(height=350, xaxis_title='clv', yaxis_title='customer_id', uirevision='const')
+    
+    return fig1, fig2
+
+@st.cache_data
+def export_csv(filtered_df):
+    """CSV download payload, serialized once per filtered frame instead of on every rerun"""
+    return filtered_df.to_csv(index=False)
+
+@st.cache_data(ttl=60)
+def last_updated():
+    """Header timestamp, formatted at most once a minute rather than on every widget interaction"""
+    return datetime.now().strftime("%H:%M:%S")
+
+def change_page(step):
+    """Move the customer card list by one page (button callback, so the rerun already sees the new page)"""
+    st.session_state.page += step
+
+@st.fragment
+def render_customer_cards(filtered_df, display_count):
+    """Customer card list; a fragment so paging reruns only the cards, not the whole dashboard"""
+    st.subheader(f"High-Risk Customers ({len(filtered_df)} found)")
+    
+    if len(filtered_df) > 0:
+        # Only the current page of cards is built; clamp the page in case the filter shrank the list
+        page_count = -(-len(filtered_df) // display_count)
+        page = min(st.session_state.setdefault('page', 0), page_count - 1)
+        st.session_state.page = page
+        
+        card_df = filtered_df.iloc[page * display_count:(page + 1) * display_count]
+        
+        # Pull each column out as an array once (filling absent report fields with their defaults)
+        # so the loop indexes plain arrays instead of building a dict per row
+        card_df = card_df.assign(**{col: default for col, default in CARD_DEFAULTS.items() if col not in card_df})
+        cols = {col: card_df[col].to_numpy() for col in ['customer_id', 'churn_risk_score', *CARD_DEFAULTS]}
+        
+        # Look up every card's risk tier with one binary search over the tier bounds (a missing score counts as medium)
+        tiers = np.searchsorted(RISK_TIER_BOUNDS, card_df['churn_risk_score'].fillna(0).to_numpy(), side='right')
+        cols['risk_class'] = RISK_TIER_CLASSES[tiers]
+        
+        for i in range(len(card_df)):
+            idx = page * display_count + i + 1
+            risk_class = cols['risk_class'][i]
+            color_text = RISK_TIER_LABELS[risk_class]
+            
+            with st.container():
+                # Badge, name and CLV as one HTML row (styled by the card-row classes above)
+                st.html(
+                    f"<div class='card-row'>"
+                    f"<div class='risk-card {risk_class}'><h3>{idx}</h3><p>{color_text}</p></div>"
+                    f"<div class='card-name'><h4>{cols['customer_id'][i]}</h4><p>{cols['business_type'][i]} • {cols['region'][i]}</p></div>"
+                    f"<div class='card-clv'><h3>£{cols['clv'][i]:,.0f}</h3></div>"
+                    f"</div>"
+                )
+                
+                with st.expander("📋 View Details & Products"):
+                    # The five detail figures as one single-row grid rather than five metric elements
+                    st.dataframe(
+                        pd.DataFrame([{
+                            "⏰ Churn In": f"{cols['days_until_churn'][i]} days",
+                            "🎯 Risk": f"{cols['churn_risk_score'][i]:.0f}/100",
+                            "💰 CLV": f"£{cols['clv'][i]:,.0f}",
+                            "📦 Cycle": f"{cols['purchase_cycle'][i]} days",
+                            "📈 ROI": f"{cols['retention_roi'][i]:,.0f}%",
+                        }]),
+                        width='stretch',
+                        hide_index=True
+                    )
+                    
+                    st.divider()
+                    
+                    st.write("**📦 Products at Risk:**")
+                    st.html(PRODUCT_GRID_HTML)
+                    
+                    st.divider()
+                    
+                    col_x, col_y = st.columns(2)
+                    with col_x:
+                        st.write("**Customer Info**")
+                        st.info(f"📅 Churn: {cols['predicted_churn_date'][i]}\n📊 Trend: {cols['spending_trend'][i]:.1f}%\n💼 Type: {cols['business_type'][i]}")
+                    with col_y:
+                        st.write("**Action Plan**")
+                        st.success(f"💰 Discount: {cols['recommended_discount_pct'][i]}%\n🎯 {cols['action'][i]}\n✅ Save 5 products")
+                
+                st.divider()
+        
+        prev_col, page_col, next_col = st.columns([1, 3, 1])
+        with prev_col:
+            st.button("⬅️ Previous", on_click=change_page, args=(-1,), disabled=page == 0, width='stretch')
+        with page_col:
+            st.html(f"<p style='text-align: center;'>Page {page + 1} of {page_count}</p>")
+        with next_col:
+            st.button("Next ➡️", on_click=change_page, args=(1,), disabled=page >= page_count - 1, width='stretch')
+    else:
+        st.info("✅ No customers in this category")
+
+@st.fragment
+def render_products(filtered_df, total_customers):
+    """Products view; a fragment so changing the product selection reruns only this view"""
+    st.subheader("📦 Products at Risk")
+    
+    products = st.multiselect("Select Products:", PRODUCTS, default=PRODUCTS)
+    
+    if products:
+        # Aggregate once; the metrics and every product row reuse these scalars
+        n_customers = len(filtered_df)
+        total_clv = filtered_df['clv'].sum()
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("📦 Products", len(products))
+        with col2:
+            st.metric("👥 Customers", n_customers)
+        with col3:
+            st.metric("💰 Risk", f"£{total_clv:,.0f}")
+        
+        st.divider()
+        
+        # One native grid instead of a columns/markdown row per product
+        product_df = pd.DataFrame({
+            'Product': [f"📦 {product}" for product in products],
+            'Customers': n_customers,
+            'Revenue': int(total_clv / len(products)),
+        })
+        st.dataframe(
+            product_df,
+            column_config={
+                'Customers': st.column_config.ProgressColumn("Customers at Risk", format="%d", min_value=0, max_value=total_customers),
+                'Revenue': st.column_config.NumberColumn("Revenue", format="£%d"),
+            },
+            width='stretch',
+            hide_index=True
+        )
 
 try:
-    with open('churn_report.json') as f:
-        data = json.load(f)
+    report_mtime = os.path.getmtime('churn_report.json')
+    data = load_report('churn_report.json', report_mtime)
+    high_risk_df = load_high_risk_df('churn_report.json', report_mtime)
 except:
     st.error("Error loading churn_report.json")
     st.stop()
@@ -20,7 +279,7 @@ with col1:
     st.title("🎯 Customer Churn Detection System")
     st.markdown("**AI-Powered B2B Customer Retention Intelligence**")
 with col2:
-    st.metric("Last Updated", datetime.now().strftime("%H:%M:%S"))
+    st.metric("Last Updated", last_updated())
 
 st.divider()
 
@@ -45,149 +304,67 @@ filter_col1, filter_col2, filter_col3 = st.columns(3)
 with filter_col1:
     risk_filter = st.selectbox("Filter by Risk:", ["All", "Critical (70+)", "High (50-70)"], index=0)
 with filter_col2:
-    sort_by = st.selectbox("Sort by:", ["Revenue", "Risk Score", "Days Until Churn"], index=0)
+    sort_by = st.selectbox("Sort by:", list(SORT_COLUMNS), index=0)
 with filter_col3:
-    display_count = st.slider("Show customers:", 3, min(20, len(data['high_risk_customers'])), 8)
+    display_count = st.slider("Customers per page:", 3, min(20, len(data['high_risk_customers'])), 8)
 
-high_risk_df = pd.DataFrame(data['high_risk_customers'])
-
-if "Critical" in risk_filter:
-    filtered_df = high_risk_df[high_risk_df['churn_risk_score'] >= 70]
-elif "High" in risk_filter:
-    filtered_df = high_risk_df[(high_risk_df['churn_risk_score'] >= 50) & (high_risk_df['churn_risk_score'] < 70)]
-else:
-    filtered_df = high_risk_df
-
-if "Revenue" in sort_by:
-    filtered_df = filtered_df.sort_values('clv', ascending=False)
-elif "Risk" in sort_by:
-    filtered_df = filtered_df.sort_values('churn_risk_score', ascending=False)
-else:
-    filtered_df = filtered_df.sort_values('days_until_churn', ascending=True)
+# Reuse this session's filtered frame while the selection and report are unchanged,
+# so reruns from other widgets skip even the cache lookup (which hashes the whole frame)
+filter_key = (risk_filter, sort_by, report_mtime)
+if st.session_state.get('filter_key') != filter_key:
+    st.session_state.filter_key = filter_key
+    st.session_state.filtered_df = apply_filter_sort(high_risk_df, risk_filter, sort_by)
+filtered_df = st.session_state.filtered_df
 
 st.divider()
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔴 At-Risk Customers", "📊 Analytics", "📦 Products", "💡 Strategies", "⚙️ Settings"])
+# st.tabs runs every tab body on each rerun, so only the selected view is built
+view = st.radio("View", ["🔴 At-Risk Customers", "📊 Analytics", "📦 Products", "💡 Strategies", "⚙️ Settings"], horizontal=True, label_visibility="collapsed")
 
-with tab1:
-    st.subheader(f"High-Risk Customers ({len(filtered_df)} found)")
-    
-    if len(filtered_df) > 0:
-        for idx, (_, row) in enumerate(filtered_df.head(display_count).iterrows(), 1):
-            if row['churn_risk_score'] >= 85:
-                color_code = "#dc2626"
-                color_text = "🔴 CRITICAL"
-            elif row['churn_risk_score'] >= 75:
-                color_code = "#ea580c"
-                color_text = "🟠 HIGH"
-            else:
-                color_code = "#f59e0b"
-                color_text = "🟡 MEDIUM"
-            
-            with st.container():
-                col1, col2, col3 = st.columns([1, 5, 2])
-                with col1:
-                    st.markdown(f"<div style='text-align: center; padding: 1rem; background: {color_code}; border-radius: 10px; color: white;'><h3>{idx}</h3><p>{color_text}</p></div>", unsafe_allow_html=True)
-                with col2:
-                    st.markdown(f"<h4 style='margin: 0; color: #1e40af;'>{row['customer_id']}</h4><p style='margin: 0.5rem 0; color: #666;'>{row.get('business_type', 'Unknown')} • {row.get('region', 'Unknown')}</p>", unsafe_allow_html=True)
-                with col3:
-                    st.markdown(f"<h3 style='margin: 0; color: #dc2626;'>£{row.get('clv', 0):,.0f}</h3>", unsafe_allow_html=True)
-                
-                with st.expander("📋 View Details & Products"):
-                    col_a, col_b, col_c, col_d, col_e = st.columns(5)
-                    with col_a:
-                        st.metric("⏰ Churn In", f"{row.get('days_until_churn', '?')} days")
-                    with col_b:
-                        st.metric("🎯 Risk", f"{row['churn_risk_score']:.0f}/100")
-                    with col_c:
-                        st.metric("💰 CLV", f"£{row.get('clv', 0):,.0f}")
-                    with col_d:
-                        st.metric("📦 Cycle", f"{row.get('purchase_cycle', 30)} days")
-                    with col_e:
-                        st.metric("📈 ROI", f"{row.get('retention_roi', 0):,.0f}%")
-                    
-                    st.divider()
-                    
-                    st.write("**📦 Products at Risk:**")
-                    products = ['Cheese Dips', 'Chicken Dips', 'Drinks', 'Sauces', 'Frozen Items']
-                    prod_cols = st.columns(5)
-                    for prod_col, product in zip(prod_cols, products):
-                        with prod_col:
-                            st.markdown(f"<div style='background: #dbeafe; padding: 1rem; border-radius: 8px; text-align: center; border-left: 4px solid #3b82f6;'><p style='margin: 0; font-size: 0.9rem;'>📦 {product}</p><p style='margin: 0.5rem 0; color: #dc2626;'>AT RISK</p></div>", unsafe_allow_html=True)
-                    
-                    st.divider()
-                    
-                    col_x, col_y = st.columns(2)
-                    with col_x:
-                        st.write("**Customer Info**")
-                        st.info(f"📅 Churn: {row.get('predicted_churn_date', 'N/A')}\n📊 Trend: {row.get('spending_trend', 0):.1f}%\n💼 Type: {row.get('business_type', 'N/A')}")
-                    with col_y:
-                        st.write("**Action Plan**")
-                        st.success(f"💰 Discount: {row.get('recommended_discount_pct', 0)}%\n🎯 {row.get('action', 'Monitor')}\n✅ Save 5 products")
-                
-                st.divider()
-    else:
-        st.info("✅ No customers in this category")
+if view == "🔴 At-Risk Customers":
+    render_customer_cards(filtered_df, display_count)
 
-with tab2:
+elif view == "📊 Analytics":
     st.subheader("📊 Analytics")
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.write("**Risk Distribution**")
-        fig1 = px.histogram(filtered_df, x='churn_risk_score', nbins=15, color_discrete_sequence=['#3b82f6'])
-        fig1.update_layout(showlegend=False, height=350)
-        st.plotly_chart(fig1, use_container_width=True)
+        fig1, fig2 = build_analytics_figures(filtered_df)
+        st.plotly_chart(fig1, width='stretch')
     
     with col2:
         st.write("**Top 10 Customers**")
-        top_10 = filtered_df.nlargest(10, 'clv')
-        fig2 = px.bar(top_10, x='clv', y='customer_id', orientation='h', color='churn_risk_score', color_continuous_scale='Reds')
-        fig2.update_layout(height=350)
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(fig2, width='stretch')
 
-with tab3:
-    st.subheader("📦 Products at Risk")
-    
-    products = st.multiselect("Select Products:", ['Cheese Dips', 'Chicken Dips', 'Drinks', 'Sauces', 'Frozen Items'], 
-                             default=['Cheese Dips', 'Chicken Dips', 'Drinks', 'Sauces', 'Frozen Items'])
-    
-    if products:
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("📦 Products", len(products))
-        with col2:
-            st.metric("👥 Customers", len(filtered_df))
-        with col3:
-            st.metric("💰 Risk", f"£{filtered_df['clv'].sum():,.0f}")
-        
-        st.divider()
-        
-        for product in products:
-            col_a, col_b, col_c = st.columns([1, 3, 1])
-            with col_a:
-                st.markdown(f"<div style='background: #fecaca; padding: 1rem; border-radius: 8px; text-align: center;'><h3 style='margin: 0;'>{len(filtered_df)}</h3><p style='margin: 0; font-size: 0.8rem;'>Customers</p></div>", unsafe_allow_html=True)
-            with col_b:
-                st.markdown(f"<h4 style='margin: 0;'>📦 {product}</h4><p style='margin: 0.5rem 0; color: #666;'>At risk from {len(filtered_df)} customers</p>", unsafe_allow_html=True)
-            with col_c:
-                revenue_per_product = filtered_df['clv'].sum() / len(products) if products else 0
-                st.markdown(f"<div style='background: #dcfce7; padding: 1rem; border-radius: 8px; text-align: center;'><h3 style='margin: 0; color: #dc2626;'>£{int(revenue_per_product):,}</h3><p style='margin: 0; font-size: 0.8rem;'>Revenue</p></div>", unsafe_allow_html=True)
-            st.divider()
-
-with tab4:
+elif view == "📦 Products":
+    render_products(filtered_df, len(high_risk_df))
+
+elif view == "💡 Strategies":
     st.subheader("💡 Retention Strategies")
     
-    for idx, (_, row) in enumerate(filtered_df.head(5).iterrows(), 1):
-        st.markdown(f"<div style='padding: 1rem; background: #f3f4f6; border-radius: 8px; margin: 0.5rem 0;'><h5 style='margin: 0;'>{idx}. {row['customer_id']}</h5><p style='margin: 0.5rem 0;'>💰 Offer {row.get('recommended_discount_pct', 0)}% discount | ⏰ Act in {row.get('days_until_churn', '?')} days | 📈 ROI: {row.get('retention_roi', 0):,.0f}%</p></div>", unsafe_allow_html=True)
+    # The top five strategies as one native table (ranked by the current sort)
+    strategies_df = filtered_df.head(5).reindex(columns=['customer_id', 'recommended_discount_pct', 'days_until_churn', 'retention_roi'])
+    # Column formats are printf-style without digit grouping, so ROI is pre-formatted like the old list (8,516%)
+    strategies_df['retention_roi'] = strategies_df['retention_roi'].map('{:,.0f}%'.format, na_action='ignore')
+    st.dataframe(
+        strategies_df.set_axis(range(1, len(strategies_df) + 1)),
+        column_config={
+            'customer_id': st.column_config.TextColumn("Customer"),
+            'recommended_discount_pct': st.column_config.NumberColumn("💰 Offer", format="%d%% discount"),
+            'days_until_churn': st.column_config.NumberColumn("⏰ Act in", format="%d days"),
+            'retention_roi': st.column_config.TextColumn("📈 ROI"),
+        },
+        width='stretch'
+    )
 
-with tab5:
+elif view == "⚙️ Settings":
     st.subheader("⚙️ Settings")
     
     col1, col2 = st.columns(2)
     with col1:
         st.info(f"📊 Customers: {data['summary']['total_customers']}\n🔴 High Risk: {data['summary']['high_risk_count']}\n💰 Revenue at Risk: £{data['summary']['total_revenue_at_risk']:,}")
     with col2:
-        csv = filtered_df.to_csv(index=False)
-        st.download_button("📥 Download CSV", csv, "customers.csv", "text/csv", use_container_width=True)
+        st.download_button("📥 Download CSV", export_csv(filtered_df), "customers.csv", "text/csv", width='stretch')
 
@@ -1,25 +1,34 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
-from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+# Risk level labels, lowest to highest; risk_level is a categorical over these
+RISK_LOW, RISK_MEDIUM, RISK_HIGH = 'Low Risk', 'Medium Risk', 'High Risk'
+RISK_LEVELS = [RISK_LOW, RISK_MEDIUM, RISK_HIGH]
+
+
+def _zscore(values):
+    """Population z-scores of a numeric column, with missing values treated as 0"""
+    values = values.fillna(0).to_numpy(dtype=float)
+    std = values.std()
+    if std == 0:
+        return np.zeros_like(values)
+    return (values - values.mean()) / std
+
+
 class ChurnDetectionModel:
     """Detect customers at risk of churning using multiple techniques"""
     
     def __init__(self, anomaly_threshold=-0.5):
         self.anomaly_threshold = anomaly_threshold
-        self.scaler = StandardScaler()
-        self.isolation_forest = IsolationForest(contamination=0.2, random_state=42)
         self.customer_profiles = None
     
     def prepare_customer_metrics(self, df):
         """Calculate key metrics for each customer per month"""
         
         # Monthly spending by customer
-        monthly_spend = df.groupby(['customer_id', 'month']).agg({
+        monthly_spend = df.groupby(['customer_id', 'month'], observed=True).agg({
             'total_value': 'sum',
             'quantity': 'sum',
             'product': 'count'  # number of SKUs purchased
@@ -27,70 +36,77 @@ class ChurnDetectionModel:
         
         monthly_spend.columns = ['customer_id', 'month', 'spending', 'total_quantity', 'num_products']
         
-        # Calculate trend metrics for each customer
-        customer_metrics = []
-        
-        for customer in df['customer_id'].unique():
-            customer_data = monthly_spend[monthly_spend['customer_id'] == customer].sort_values('month')
-            
-            if len(customer_data) < 2:
-                continue
-            
-            spending_values = customer_data['spending'].values
-            months = customer_data['month'].values
-            
-            # Calculate trend using linear regression
-            z = np.polyfit(months, spending_values, 1)
-            trend_slope = z[0]  # Negative slope = decreasing spend
-            
-            # Calculate volatility
-            spending_std = spending_values.std()
-            spending_mean = spending_values.mean()
-            
-            # Recent vs historical average
-            recent_avg = spending_values[-3:].mean() if len(spending_values) >= 3 else spending_values.mean()
-            historical_avg = spending_values[:-3].mean() if len(spending_values) > 3 else spending_values.mean()
-            
-            # Calculate percentage change
-            pct_change = ((recent_avg - historical_avg) / (historical_avg + 1)) * 100
-            
-            # Number of months with zero spending
-            zero_months = (spending_values == 0).sum()
-            
-            customer_metrics.append({
-                'customer_id': customer,
-                'avg_spending': spending_mean,
-                'spending_trend': trend_slope,
-                'spending_volatility': spending_std,
-                'recent_vs_historical_pct': pct_change,
-                'zero_spending_months': zero_months,
-                'total_months': len(spending_values),
-                'latest_spending': spending_values[-1],
-                'first_spending': spending_values[0]
-            })
-        
-        return pd.DataFrame(customer_metrics)
+        # Stack every customer's monthly series into one (customers x months)
+        # matrix, left-aligned and NaN-padded, so the trend metrics below are
+        # computed with a few array ops instead of a loop per customer
+        customers = df['customer_id'].unique()
+        monthly_spend = monthly_spend.sort_values(['customer_id', 'month'])
+        rows = pd.Index(customers).get_indexer(monthly_spend['customer_id'])
+        cols = monthly_spend.groupby('customer_id', observed=True).cumcount().to_numpy()
+        
+        spending = np.full((len(customers), cols.max() + 1), np.nan)
+        months = np.full_like(spending, np.nan)
+        spending[rows, cols] = monthly_spend['spending'].to_numpy()
+        months[rows, cols] = monthly_spend['month'].to_numpy()
+        lengths = np.bincount(rows, minlength=len(customers))
+        
+        # Customers need at least two months of history for a trend
+        keep = lengths >= 2
+        customers, spending, months, lengths = customers[keep], spending[keep], months[keep], lengths[keep]
+        
+        # Calculate trend using the closed-form least-squares slope
+        month_mean = np.nanmean(months, axis=1, keepdims=True)
+        spending_mean = np.nanmean(spending, axis=1, keepdims=True)
+        trend_slope = (
+            np.nansum((months - month_mean) * (spending - spending_mean), axis=1) /
+            np.nansum((months - month_mean) ** 2, axis=1)
+        )  # Negative slope = decreasing spend
+        
+        # Calculate volatility
+        spending_std = np.nanstd(spending, axis=1)
+        
+        # Recent (last 3 months) vs historical average; short series use all months for both
+        position = np.arange(spending.shape[1])
+        valid = position < lengths[:, None]
+        recent_mask = valid & (position >= lengths[:, None] - 3)
+        historical_mask = valid & ((position < lengths[:, None] - 3) | (lengths[:, None] <= 3))
+        filled = np.where(valid, spending, 0)
+        recent_avg = (filled * recent_mask).sum(axis=1) / recent_mask.sum(axis=1)
+        historical_avg = (filled * historical_mask).sum(axis=1) / historical_mask.sum(axis=1)
+        
+        # Calculate percentage change
+        pct_change = ((recent_avg - historical_avg) / (historical_avg + 1)) * 100
+        
+        return pd.DataFrame({
+            'customer_id': customers,
+            'avg_spending': spending_mean.ravel(),
+            'spending_trend': trend_slope,
+            'spending_volatility': spending_std,
+            'recent_vs_historical_pct': pct_change,
+            'zero_spending_months': (spending == 0).sum(axis=1),  # Number of months with zero spending
+            'total_months': lengths,
+            'latest_spending': spending[np.arange(len(lengths)), lengths - 1],
+            'first_spending': spending[:, 0]
+        })
     
     def detect_churn_risk(self, metrics_df):
         """Score customers for churn risk using multiple indicators"""
         
-        # Initialize risk score
-        metrics_df['churn_risk_score'] = 0
-        
+        # Every component is computed as a plain array and the new columns are added in one assign()
         # 1. Trend-based scoring (negative trend = risk)
-        trend_scores = stats.zscore(metrics_df['spending_trend'].fillna(0))
-        metrics_df['trend_risk'] = np.where(trend_scores < -0.5, abs(trend_scores), 0)
+        trend_scores = _zscore(metrics_df['spending_trend'])
+        trend_risk = np.where(trend_scores < -0.5, -trend_scores, 0)
         
         # 2. Recent decline scoring
-        recent_decline_scores = stats.zscore(metrics_df['recent_vs_historical_pct'].fillna(0))
-        metrics_df['decline_risk'] = np.where(recent_decline_scores < -0.5, abs(recent_decline_scores), 0)
+        recent_decline_scores = _zscore(metrics_df['recent_vs_historical_pct'])
+        decline_risk = np.where(recent_decline_scores < -0.5, -recent_decline_scores, 0)
         
         # 3. Zero spending months (strong indicator)
-        metrics_df['inactivity_risk'] = metrics_df['zero_spending_months'] * 0.5
+        inactivity_risk = metrics_df['zero_spending_months'].to_numpy() * 0.5
         
         # 4. Volatility risk (erratic behavior = potential churn)
-        volatility_scores = stats.zscore(metrics_df['spending_volatility'].fillna(0))
-        metrics_df['volatility_risk'] = np.where(volatility_scores > 1, volatility_scores, 0)
+        volatility_scores = _zscore(metrics_df['spending_volatility'])
+        volatility_risk = np.where(volatility_scores > 1, volatility_scores, 0)
         
         # Combine into final churn risk score (0-100)
         weights = {
@@ -100,25 +116,31 @@ class ChurnDetectionModel:
             'volatility_risk': 0.10
         }
         
-        metrics_df['churn_risk_score'] = (
-            metrics_df['trend_risk'] * weights['trend_risk'] +
-            metrics_df['decline_risk'] * weights['decline_risk'] +
-            metrics_df['inactivity_risk'] * weights['inactivity_risk'] +
-            metrics_df['volatility_risk'] * weights['volatility_risk']
+        churn_risk_score = (
+            trend_risk * weights['trend_risk'] +
+            decline_risk * weights['decline_risk'] +
+            inactivity_risk * weights['inactivity_risk'] +
+            volatility_risk * weights['volatility_risk']
         )
         
         # Normalize to 0-100 scale
-        max_score = metrics_df['churn_risk_score'].max()
+        max_score = churn_risk_score.max()
         if max_score > 0:
-            metrics_df['churn_risk_score'] = (metrics_df['churn_risk_score'] / max_score) * 100
+            churn_risk_score = (churn_risk_score / max_score) * 100
         
-        metrics_df['churn_risk_score'] = metrics_df['churn_risk_score'].round(2)
+        metrics_df = metrics_df.assign(
+            churn_risk_score=churn_risk_score.round(2),
+            trend_risk=trend_risk,
+            decline_risk=decline_risk,
+            inactivity_risk=inactivity_risk,
+            volatility_risk=volatility_risk
+        )
         
         # Classify risk level
         metrics_df['risk_level'] = pd.cut(
             metrics_df['churn_risk_score'],
             bins=[0, 30, 60, 100],
-            labels=['Low Risk', 'Medium Risk', 'High Risk'],
+            labels=RISK_LEVELS,
             include_lowest=True
         )
         
@@ -130,76 +152,75 @@ class ChurnDetectionModel:
         at_risk_ids = at_risk_customers['customer_id'].values
         
         # For at-risk customers, find products with declining purchases
-        at_risk_data = df[df['customer_id'].isin(at_risk_ids)].copy()
-        
-        product_risk = []
-        
-        for customer in at_risk_ids:
-            customer_data = at_risk_data[at_risk_data['customer_id'] == customer]
-            
-            for product in customer_data['product'].unique():
-                product_data = customer_data[customer_data['product'] == product].sort_values('month')
-                
-                if len(product_data) > 2:
-                    quantities = product_data['quantity'].values
-                    recent_qty = quantities[-2:].mean()
-                    historical_qty = quantities[:-2].mean()
-                    
-                    if historical_qty > 0:
-                        qty_change_pct = ((recent_qty - historical_qty) / historical_qty) * 100
-                        
-                        product_risk.append({
-                            'customer_id': customer,
-                            'product': product,
-                            'historical_avg_qty': historical_qty,
-                            'recent_avg_qty': recent_qty,
-                            'quantity_change_pct': qty_change_pct,
-                            'last_purchase_qty': quantities[-1]
-                        })
-        
-        return pd.DataFrame(product_risk)
+        # Only the columns used below; nothing mutates this slice, so no defensive copy
+        at_risk_data = df.loc[df['customer_id'].isin(at_risk_ids), ['customer_id', 'product', 'month', 'quantity']]
+        
+        # Output order matches a walk of the customers in at-risk order, each customer's
+        # products in order of first purchase
+        keys = ['customer_id', 'product']
+        pairs = at_risk_data[keys].drop_duplicates()
+        customer_rank = pd.Index(at_risk_ids).get_indexer(pairs['customer_id'])
+        group_order = pd.MultiIndex.from_frame(pairs.iloc[np.argsort(customer_rank, kind='stable')])
+        
+        # One (customer, product) grouping over the month-ordered rows, with each series'
+        # last two purchases marked as recent, replaces the per-customer/per-product filters
+        at_risk_data = at_risk_data.sort_values('month', kind='stable')
+        is_recent = at_risk_data.groupby(keys, sort=False, observed=True).cumcount(ascending=False) < 2
+        quantity = at_risk_data['quantity']
+        
+        product_risk = at_risk_data.assign(
+            historical_qty=quantity.mask(is_recent),
+            recent_qty=quantity.where(is_recent)
+        ).groupby(keys, observed=True).agg(
+            purchases=('quantity', 'size'),
+            historical_avg_qty=('historical_qty', 'mean'),
+            recent_avg_qty=('recent_qty', 'mean'),
+            last_purchase_qty=('quantity', 'last')
+        ).reindex(group_order)
+        
+        product_risk = product_risk[(product_risk['purchases'] > 2) & (product_risk['historical_avg_qty'] > 0)]
+        product_risk = product_risk.assign(quantity_change_pct=(
+            (product_risk['recent_avg_qty'] - product_risk['historical_avg_qty']) /
+            product_risk['historical_avg_qty']
+        ) * 100)
+        
+        return product_risk.reset_index()[[
+            'customer_id', 'product', 'historical_avg_qty', 'recent_avg_qty',
+            'quantity_change_pct', 'last_purchase_qty'
+        ]]
     
     def generate_retention_strategy(self, at_risk_df, product_risk_df):
         """Generate specific retention strategies for at-risk customers"""
         
-        strategies = []
-        
-        for _, customer in at_risk_df.iterrows():
-            customer_id = customer['customer_id']
-            risk_level = customer['risk_level']
-            risk_score = customer['churn_risk_score']
-            
-            # Get products with declining purchases
-            lost_products = product_risk_df[
-                (product_risk_df['customer_id'] == customer_id) &
-                (product_risk_df['quantity_change_pct'] < -20)
-            ]
-            
-            if len(lost_products) > 0:
-                discount_recommendation = self._calculate_discount(risk_score)
-                
-                strategies.append({
-                    'customer_id': customer_id,
-                    'risk_level': risk_level,
-                    'risk_score': risk_score,
-                    'products_at_risk': ', '.join(lost_products['product'].unique()),
-                    'recommended_discount_pct': discount_recommendation,
-                    'action': f"Proactive outreach with {discount_recommendation}% discount on lost products",
-                    'priority': 'URGENT' if risk_score > 70 else 'HIGH' if risk_score > 50 else 'MEDIUM'
-                })
-        
-        return pd.DataFrame(strategies).sort_values('risk_score', ascending=False)
+        # Each customer's distinct declining products (in product-risk order), joined once per customer
+        lost_products = product_risk_df[product_risk_df['quantity_change_pct'] < -20]
+        products_at_risk = lost_products.drop_duplicates(['customer_id', 'product']).groupby(
+            'customer_id', sort=False, observed=True
+        )['product'].agg(', '.join).rename('products_at_risk')
+        
+        # Only customers with at least one lost product get a strategy
+        strategies = at_risk_df[['customer_id', 'risk_level', 'churn_risk_score']].rename(
+            columns={'churn_risk_score': 'risk_score'}
+        ).merge(products_at_risk, left_on='customer_id', right_index=True, how='inner')
+        
+        risk_score = strategies['risk_score'].to_numpy()
+        discount_recommendation = pd.Series(self._calculate_discounts(risk_score), index=strategies.index)
+        
+        strategies = strategies.assign(
+            recommended_discount_pct=discount_recommendation,
+            action="Proactive outreach with " + discount_recommendation.astype(str) + "% discount on lost products",
+            priority=np.select([risk_score > 70, risk_score > 50], ['URGENT', 'HIGH'], 'MEDIUM')
+        )
+        
+        return strategies.sort_values('risk_score', ascending=False)
     
     def _calculate_discount(self, risk_score):
         """Calculate recommended discount based on risk"""
-        if risk_score > 75:
-            return 15
-        elif risk_score > 60:
-            return 12
-        elif risk_score > 45:
-            return 8
-        else:
-            return 5
+        return int(self._calculate_discounts(risk_score))
+    
+    def _calculate_discounts(self, risk_scores):
+        """Recommended discount for each score in an array"""
+        return np.select([risk_scores > 75, risk_scores > 60, risk_scores > 45], [15, 12, 8], 5)
 
 
 def run_churn_detection(transactions_df):
@@ -211,6 +232,15 @@ def run_churn_detection(transactions_df):
     
     model = ChurnDetectionModel()
     
+    # Customer and product ids are the grouping keys throughout, so hash them once as categoricals.
+    # Quantity and month are downcast only as far as their actual values allow (non-integral data is
+    # left alone); money stays float64 so spend sums keep their pennies
+    input_dtypes = transactions_df.dtypes
+    transactions_df = transactions_df.astype({'customer_id': 'category', 'product': 'category'}).assign(
+        quantity=pd.to_numeric(transactions_df['quantity'], downcast='integer'),
+        month=pd.to_numeric(transactions_df['month'], downcast='integer')
+    )
+    
     # Step 1: Prepare metrics
     print("\n[1/4] Preparing customer metrics...")
     metrics = model.prepare_customer_metrics(transactions_df)
@@ -219,7 +249,7 @@ def run_churn_detection(transactions_df):
     # Step 2: Detect churn risk
     print("\n[2/4] Detecting churn risk...")
     at_risk_customers = model.detect_churn_risk(metrics)
-    high_risk = at_risk_customers[at_risk_customers['risk_level'] == 'High Risk']
+    high_risk = at_risk_customers[at_risk_customers['risk_level'] == RISK_HIGH]
     print(f"✓ Identified {len(high_risk)} high-risk customers")
     
     # Step 3: Identify at-risk products
@@ -232,10 +262,16 @@ def run_churn_detection(transactions_df):
     strategies = model.generate_retention_strategy(high_risk, product_risk)
     print(f"✓ Generated {len(strategies)} retention recommendations")
     
+    # Hand the results back with the caller's column types rather than the internal narrowed ones
     return {
-        'customer_metrics': at_risk_customers,
-        'product_risk': product_risk,
-        'retention_strategies': strategies
+        'customer_metrics': at_risk_customers.astype({'customer_id': input_dtypes['customer_id']}),
+        'product_risk': product_risk.astype({
+            'customer_id': input_dtypes['customer_id'], 'product': input_dtypes['product'],
+            'last_purchase_qty': input_dtypes['quantity']
+        }),
+        'retention_strategies': strategies.astype({
+            'customer_id': input_dtypes['customer_id'], 'risk_level': object
+        })
     }
 
 
@@ -245,6 +281,6 @@ if __name__ == "__main__":
     results = run_churn_detection(df)
     
     print("\n\nHIGH-RISK CUSTOMERS:")
-    print(results['customer_metrics'][results['customer_metrics']['risk_level'] == 'High Risk'][
+    print(results['customer_metrics'][results['customer_metrics']['risk_level'] == RISK_HIGH][
         ['customer_id', 'churn_risk_score', 'spending_trend', 'recent_vs_historical_pct', 'risk_level']
     ])
@@ -1,14 +1,12 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
 
 class TransactionDataGenerator:
     """Generate realistic B2B supplier transaction data with churn patterns"""
     
     def __init__(self, num_customers=50, months=12, seed=42):
-        np.random.seed(seed)
-        random.seed(seed)
+        self.rng = np.random.default_rng(seed)
         self.num_customers = num_customers
         self.months = months
         self.products = ['Chicken Dips', 'Cheese Dips', 'Drinks', 'Sauces', 'Frozen Items']
@@ -19,52 +17,53 @@ class TransactionDataGenerator:
         baseline = {}
         for customer in self.customers:
             baseline[customer] = {
-                product: np.random.randint(5, 50) 
+                product: self.rng.integers(5, 50) 
                 for product in self.products
             }
         return baseline
     
     def generate_transactions(self):
         """Generate 12 months of transaction data with churn patterns"""
-        transactions = []
         baseline = self.generate_baseline_purchases()
         
-        # Mark some customers as "churned" (will reduce purchases)
-        churned_customers = random.sample(self.customers, k=int(0.3 * self.num_customers))
-        churn_start_month = random.randint(6, 10)  # Churn happens mid-year
+        # Mark some customers as "churned" (will reduce purchases), as a mask over customer positions
+        is_churned = np.zeros(self.num_customers, dtype=bool)
+        is_churned[self.rng.choice(self.num_customers, size=int(0.3 * self.num_customers), replace=False)] = True
+        churn_start_month = self.rng.integers(6, 11)  # Churn happens mid-year (months 6-10)
         
         start_date = datetime(2023, 1, 1)
         
-        for month in range(self.months):
-            current_date = start_date + timedelta(days=30*month)
-            
-            for customer in self.customers:
-                for product in self.products:
-                    base_qty = baseline[customer][product]
-                    
-                    # Add natural variation
-                    qty = base_qty + np.random.randint(-5, 5)
-                    
-                    # If customer has churned, gradually reduce purchases
-                    if customer in churned_customers and month >= churn_start_month:
-                        churn_progress = (month - churn_start_month) / (self.months - churn_start_month)
-                        reduction_factor = 1 - (churn_progress * np.random.uniform(0.3, 0.8))
-                        qty = int(qty * reduction_factor)
-                    
-                    qty = max(0, qty)  # Ensure non-negative
-                    price = np.random.uniform(5, 50)  # Random pricing
-                    
-                    transactions.append({
-                        'date': current_date,
-                        'customer_id': customer,
-                        'product': product,
-                        'quantity': qty,
-                        'unit_price': round(price, 2),
-                        'total_value': round(qty * price, 2),
-                        'month': month + 1
-                    })
+        # Every quantity and price is drawn at once on a (months, customers, products)
+        # grid; flattening it gives the same row order as looping month > customer > product
+        shape = (self.months, self.num_customers, len(self.products))
+        month = np.arange(self.months)[:, None, None]
+        base_qty = np.array([[baseline[customer][product] for product in self.products] for customer in self.customers])
         
-        return pd.DataFrame(transactions)
+        # Add natural variation
+        qty = base_qty[None, :, :] + self.rng.integers(-5, 5, size=shape)
+        
+        # If customer has churned, gradually reduce purchases; the rate is drawn for every cell to keep
+        # the random stream fixed, but the reduction is only computed on churned cells
+        churn_rate = self.rng.uniform(0.3, 0.8, size=shape)
+        churned = np.broadcast_to(is_churned[None, :, None] & (month >= churn_start_month), shape)
+        if churned.any():
+            churn_progress = np.broadcast_to((month - churn_start_month) / (self.months - churn_start_month), shape)
+            qty[churned] = (qty[churned] * (1 - churn_progress[churned] * churn_rate[churned])).astype(int)
+        
+        qty = np.maximum(0, qty)  # Ensure non-negative
+        price = self.rng.uniform(5, 50, size=shape)  # Random pricing
+        
+        dates = [start_date + timedelta(days=30*m) for m in range(self.months)]
+        
+        return pd.DataFrame({
+            'date': np.repeat(dates, self.num_customers * len(self.products)),
+            'customer_id': np.tile(np.repeat(self.customers, len(self.products)), self.months),
+            'product': np.tile(self.products, self.months * self.num_customers),
+            'quantity': qty.ravel(),
+            'unit_price': price.round(2).ravel(),
+            'total_value': (qty * price).round(2).ravel(),
+            'month': np.repeat(np.arange(1, self.months + 1), self.num_customers * len(self.products))
+        })
     
     def save_data(self, filename='transactions.csv'):
         """Generate and save transaction data"""
@@ -6,6 +6,29 @@ import os
 class SupplierDatabase:
     """SQLite database for storing transactions and churn predictions"""
     
+    # Insert statements shared by every call, so sqlite3's statement cache reuses one prepared statement each
+    _INSERT_TRANSACTION_SQL = '''
+        INSERT INTO transactions
+        (date, customer_id, product, quantity, unit_price, total_value, month)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    _INSERT_METRICS_SQL = '''
+        INSERT OR REPLACE INTO customer_metrics 
+        (customer_id, avg_spending, spending_trend, spending_volatility,
+         recent_vs_historical_pct, zero_spending_months, total_months,
+         churn_risk_score, risk_level)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    _INSERT_PREDICTION_SQL = '''
+        INSERT INTO churn_predictions 
+        (customer_id, products_at_risk, recommended_discount_pct, action, priority)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    _INSERT_ACTION_SQL = '''
+        INSERT INTO retention_actions (customer_id, action_type, discount_offered)
+        VALUES (?, ?, ?)
+    '''
+    
     def __init__(self, db_name='supplier_churn.db'):
         self.db_name = db_name
         self.conn = None
@@ -16,6 +39,13 @@ class SupplierDatabase:
         self.conn = sqlite3.connect(self.db_name)
         cursor = self.conn.cursor()
         
+        # WAL journaling with NORMAL sync keeps bulk inserts from fsyncing on every commit
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        # Keep sort/index temp data in memory and give the page cache 64 MB for bulk loads
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-65536')
+        
         # Transactions table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS transactions (
@@ -74,13 +104,25 @@ class SupplierDatabase:
             )
         ''')
         
+        # Indexes for the customer history, high-risk and per-customer prediction lookups
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tx_customer_date ON transactions(customer_id, date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_risk ON customer_metrics(risk_level, churn_risk_score DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pred_customer ON churn_predictions(customer_id)')
+        
         self.conn.commit()
         print("✓ Database initialized successfully")
     
     def insert_transactions(self, df):
         """Insert transaction data into database"""
-        df.to_sql('transactions', self.conn, if_exists='append', index=False)
-        self.conn.commit()
+        insert_df = df[['date', 'customer_id', 'product', 'quantity',
+                        'unit_price', 'total_value', 'month']]
+        # sqlite3 cannot bind Timestamps; store them as text the way to_sql did
+        if pd.api.types.is_datetime64_any_dtype(insert_df['date']):
+            insert_df = insert_df.assign(date=insert_df['date'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+        
+        # Same single-transaction executemany as the other loaders, without to_sql's table introspection
+        with self.conn:
+            self.conn.executemany(self._INSERT_TRANSACTION_SQL, insert_df.itertuples(index=False, name=None))
         print(f"✓ Inserted {len(df)} transactions into database")
     
     def insert_metrics(self, metrics_df):
@@ -89,33 +131,20 @@ class SupplierDatabase:
         insert_df = metrics_df[['customer_id', 'avg_spending', 'spending_trend', 
                                 'spending_volatility', 'recent_vs_historical_pct',
                                 'zero_spending_months', 'total_months', 
-                                'churn_risk_score', 'risk_level']].copy()
-        
-        for _, row in insert_df.iterrows():
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO customer_metrics 
-                (customer_id, avg_spending, spending_trend, spending_volatility,
-                 recent_vs_historical_pct, zero_spending_months, total_months,
-                 churn_risk_score, risk_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', tuple(row))
+                                'churn_risk_score', 'risk_level']]
         
-        self.conn.commit()
+        # One executemany over plain tuples instead of an execute per iterrows() row
+        with self.conn:
+            self.conn.executemany(self._INSERT_METRICS_SQL, insert_df.itertuples(index=False, name=None))
         print(f"✓ Updated {len(insert_df)} customer metrics")
     
     def insert_predictions(self, strategies_df):
         """Insert churn predictions"""
-        for _, row in strategies_df.iterrows():
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO churn_predictions 
-                (customer_id, products_at_risk, recommended_discount_pct, action, priority)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (row['customer_id'], row['products_at_risk'], 
-                  row['recommended_discount_pct'], row['action'], row['priority']))
+        insert_df = strategies_df[['customer_id', 'products_at_risk', 'recommended_discount_pct',
+                                   'action', 'priority']]
         
-        self.conn.commit()
+        with self.conn:
+            self.conn.executemany(self._INSERT_PREDICTION_SQL, insert_df.itertuples(index=False, name=None))
         print(f"✓ Inserted {len(strategies_df)} churn predictions")
     
     def get_high_risk_customers(self):
@@ -150,13 +179,8 @@ class SupplierDatabase:
     
     def log_retention_action(self, customer_id, discount_offered):
         """Log a retention action taken"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO retention_actions (customer_id, action_type, discount_offered)
-            VALUES (?, ?, ?)
-        ''', (customer_id, 'discount_offer', discount_offered))
-        
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute(self._INSERT_ACTION_SQL, (customer_id, 'discount_offer', discount_offered))
     
     def get_action_history(self):
         """Get history of all retention actions"""
@@ -169,25 +193,26 @@ class SupplierDatabase:
     
     def get_dashboard_summary(self):
         """Get summary statistics for dashboard"""
+        # All customer_metrics figures from a single scan; the other two tables are
+        # counted in scalar subqueries so the whole summary is one round trip
+        (total_customers, high_risk, medium_risk, avg_score,
+         total_transactions, actions_pending) = self.conn.execute('''
+            SELECT COUNT(DISTINCT customer_id),
+                   SUM(CASE WHEN risk_level = 'High Risk' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN risk_level = 'Medium Risk' THEN 1 ELSE 0 END),
+                   AVG(churn_risk_score),
+                   (SELECT COUNT(*) FROM transactions),
+                   (SELECT COUNT(*) FROM retention_actions WHERE status = 'pending')
+            FROM customer_metrics
+        ''').fetchone()
+        
         summary = {
-            'total_customers': self.conn.execute(
-                'SELECT COUNT(DISTINCT customer_id) FROM customer_metrics'
-            ).fetchone()[0],
-            'high_risk_customers': self.conn.execute(
-                "SELECT COUNT(*) FROM customer_metrics WHERE risk_level = 'High Risk'"
-            ).fetchone()[0],
-            'medium_risk_customers': self.conn.execute(
-                "SELECT COUNT(*) FROM customer_metrics WHERE risk_level = 'Medium Risk'"
-            ).fetchone()[0],
-            'avg_churn_score': round(self.conn.execute(
-                'SELECT AVG(churn_risk_score) FROM customer_metrics'
-            ).fetchone()[0], 2),
-            'total_transactions': self.conn.execute(
-                'SELECT COUNT(*) FROM transactions'
-            ).fetchone()[0],
-            'actions_pending': self.conn.execute(
-                "SELECT COUNT(*) FROM retention_actions WHERE status = 'pending'"
-            ).fetchone()[0]
+            'total_customers': total_customers,
+            'high_risk_customers': high_risk or 0,
+            'medium_risk_customers': medium_risk or 0,
+            'avg_churn_score': round(avg_score, 2),
+            'total_transactions': total_transactions,
+            'actions_pending': actions_pending
         }
         return summary
     
@@ -72,7 +72,7 @@ def main():
     print(f"✓ Created {len(strategies)} retention recommendations")
     
     print("[4/4] Calculating CLV and ROI...")
-    total_revenue_at_risk = sum([r.get('clv', 0) for r in high_risk])
+    total_revenue_at_risk = sum(r.get('clv', 0) for r in high_risk)
     print(f"✓ Total revenue at risk: £{total_revenue_at_risk:,.0f}\n")
     
     # ═══════════════════════════════════════════════════════════════════════
@@ -222,8 +222,8 @@ def main():
     print(f"\n💰 TOTAL REVENUE AT RISK: £{summary_stats['total_revenue_at_risk']:,.0f}")
     print(f"   (Annual value of high-risk customers)\n")
     
-    total_discount_cost = sum([c.get('discount_cost', 0) for c in high_risk])
-    total_roi = sum([c.get('retention_roi', 0) for c in high_risk])
+    total_discount_cost = sum(c.get('discount_cost', 0) for c in high_risk)
+    total_roi = sum(c.get('retention_roi', 0) for c in high_risk)
     
     print(f"Retention Investment Required: £{total_discount_cost:,.0f}")
     print(f"   (Total discounts to save all high-risk customers)")
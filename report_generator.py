@@ -1,15 +1,67 @@
 import pandas as pd
 import json
 from datetime import datetime
-from tabulate import tabulate
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from churn_detection import RISK_LOW, RISK_MEDIUM, RISK_HIGH
+
+try:
+    import orjson  # Optional: faster JSON export
+except ImportError:
+    orjson = None
+
+
+def write_json(payload, output_file):
+    """Write an indented JSON file, serialized by orjson when it is installed"""
+    if orjson:
+        # Serialized in C straight to bytes; NaN is written as null rather than NaN
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(
+                payload, default=str,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+            ))
+    else:
+        with open(output_file, 'w') as f:
+            json.dump(payload, f, indent=2, default=str)
+
+
+def _format_table(df, headers, decimals):
+    """Render a DataFrame as a ruled text table using pandas' own formatter"""
+    if df.empty:
+        # pandas renders an empty frame as "Empty DataFrame ..."; show just the header row instead
+        header = '  '.join(headers)
+        rule = '-' * len(header)
+        return '\n'.join([rule, header, rule])
+    table = df.set_axis(headers, axis=1).to_string(
+        index=False, float_format=lambda v: f'{v:.{decimals}f}'
+    )
+    header, _, body = table.partition('\n')
+    rule = '-' * max(len(line) for line in table.splitlines())
+    return '\n'.join([rule, header, rule, body, rule])
+
 
 class ReportGenerator:
     """Generate reports and insights from churn analysis"""
     
-    def __init__(self, results_dict):
+    def __init__(self, results_dict, output_dir='reports'):
         self.metrics = results_dict['customer_metrics']
         self.product_risk = results_dict['product_risk']
         self.strategies = results_dict['retention_strategies']
+        
+        self.out = Path(output_dir)
+        self.out.mkdir(parents=True, exist_ok=True)
+        
+        # Split the metrics by risk level once; every report reads from these
+        self._risk_counts = self.metrics['risk_level'].value_counts().to_dict()
+        self._risk_groups = {
+            level: group for level, group in
+            self.metrics.groupby('risk_level', observed=True, sort=False)
+        }
+    
+    def _risk_group(self, level):
+        """Metrics rows for one risk level (empty frame if none)"""
+        return self._risk_groups.get(level, self.metrics.iloc[:0])
     
     def generate_executive_summary(self):
         """Generate high-level executive summary"""
@@ -19,9 +71,9 @@ class ReportGenerator:
         print("="*70)
         
         total_customers = len(self.metrics)
-        high_risk = len(self.metrics[self.metrics['risk_level'] == 'High Risk'])
-        medium_risk = len(self.metrics[self.metrics['risk_level'] == 'Medium Risk'])
-        low_risk = len(self.metrics[self.metrics['risk_level'] == 'Low Risk'])
+        high_risk = self._risk_counts.get(RISK_HIGH, 0)
+        medium_risk = self._risk_counts.get(RISK_MEDIUM, 0)
+        low_risk = self._risk_counts.get(RISK_LOW, 0)
         
         avg_risk_score = self.metrics['churn_risk_score'].mean()
         
@@ -34,7 +86,7 @@ class ReportGenerator:
         print(f"\nAverage Risk Score: {avg_risk_score:.1f}/100")
         
         # Financial impact estimate
-        high_risk_spending = self.metrics[self.metrics['risk_level'] == 'High Risk']['avg_spending'].sum()
+        high_risk_spending = self._risk_group(RISK_HIGH)['avg_spending'].sum()
         print(f"\nMonthly Revenue at Risk: £{high_risk_spending:,.2f}")
         print(f"Annual Revenue at Risk: £{high_risk_spending * 12:,.2f}")
     
@@ -45,24 +97,22 @@ class ReportGenerator:
         print("HIGH-RISK CUSTOMERS - DETAILED ANALYSIS")
         print("="*70)
         
-        high_risk = self.metrics[self.metrics['risk_level'] == 'High Risk'].copy()
+        high_risk = self._risk_group(RISK_HIGH)
         
         if len(high_risk) == 0:
             print("\n✓ No high-risk customers identified")
             return
         
-        # Sort by risk score
-        high_risk = high_risk.sort_values('churn_risk_score', ascending=False)
-        
         display_cols = ['customer_id', 'churn_risk_score', 'spending_trend', 
                        'recent_vs_historical_pct', 'avg_spending']
         
-        print("\n" + tabulate(
-            high_risk[display_cols].head(15),
-            headers=['Customer', 'Risk Score', 'Spending Trend', 'Recent Change %', 'Avg Monthly £'],
-            tablefmt='grid',
-            floatfmt='.2f',
-            showindex=False
+        # Top 15 by risk score, selected directly from the column subset
+        top = high_risk[display_cols].nlargest(15, 'churn_risk_score')
+        
+        print("\n" + _format_table(
+            top,
+            ['Customer', 'Risk Score', 'Spending Trend', 'Recent Change %', 'Avg Monthly £'],
+            decimals=2
         ))
     
     def generate_product_risk_report(self):
@@ -76,25 +126,20 @@ class ReportGenerator:
             print("\nNo product churn signals detected")
             return
         
-        # Find products with largest decline
-        declining_products = self.product_risk[
-            self.product_risk['quantity_change_pct'] < -30
-        ].sort_values('quantity_change_pct')
-        
         print(f"\nProducts with Significant Decline (>30%):\n")
         
-        product_summary = declining_products.groupby('product').agg({
-            'customer_id': 'count',
-            'quantity_change_pct': 'mean'
-        }).sort_values('quantity_change_pct')
-        
-        product_summary.columns = ['Customers Affected', 'Avg Decline %']
-        
-        print(tabulate(
-            product_summary,
-            headers=['Product', 'Customers Affected', 'Avg Decline %'],
-            tablefmt='grid',
-            floatfmt='.1f'
+        # Group the declining rows directly; the summary is sorted once, after grouping
+        product_summary = self.product_risk.loc[
+            self.product_risk['quantity_change_pct'] < -30
+        ].groupby('product', observed=True).agg(
+            customers_affected=('customer_id', 'count'),
+            avg_decline_pct=('quantity_change_pct', 'mean')
+        ).sort_values('avg_decline_pct', kind='stable')
+        
+        print(_format_table(
+            product_summary.reset_index(),
+            ['Product', 'Customers Affected', 'Avg Decline %'],
+            decimals=1
         ))
     
     def generate_retention_recommendations(self):
@@ -115,19 +160,19 @@ class ReportGenerator:
         print(f"   Recommended discount: {urgent['recommended_discount_pct'].iloc[0] if len(urgent) > 0 else 'N/A'}%\n")
         
         if len(urgent) > 0:
-            for _, row in urgent.head(5).iterrows():
-                print(f"   • {row['customer_id']}")
-                print(f"     Risk Score: {row['risk_score']:.1f}/100")
-                print(f"     At-Risk Products: {row['products_at_risk']}")
-                print(f"     Action: {row['action']}\n")
+            for row in urgent.head(5).itertuples(index=False):
+                print(f"   • {row.customer_id}")
+                print(f"     Risk Score: {row.risk_score:.1f}/100")
+                print(f"     At-Risk Products: {row.products_at_risk}")
+                print(f"     Action: {row.action}\n")
         
         if len(high) > 0:
             print(f"\n🟠 HIGH Priority Actions ({len(high)} customers):")
             print(f"   Recommended discount: {high['recommended_discount_pct'].iloc[0]}%\n")
             
-            for _, row in high.head(5).iterrows():
-                print(f"   • {row['customer_id']}")
-                print(f"     Action: {row['action']}\n")
+            for row in high.head(5).itertuples(index=False):
+                print(f"   • {row.customer_id}")
+                print(f"     Action: {row.action}\n")
     
     def generate_metrics_report(self):
         """Detailed metrics for all customers"""
@@ -141,36 +186,36 @@ class ReportGenerator:
             'recent_vs_historical_pct', 'churn_risk_score', 'risk_level'
         ]].sort_values('churn_risk_score', ascending=False)
         
-        print("\n" + tabulate(
+        print("\n" + _format_table(
             display_df.head(20),
-            headers=['Customer', 'Avg Spending', 'Trend', 'Recent Change %', 'Risk Score', 'Risk Level'],
-            tablefmt='grid',
-            floatfmt='.2f',
-            showindex=False
+            ['Customer', 'Avg Spending', 'Trend', 'Recent Change %', 'Risk Score', 'Risk Level'],
+            decimals=2
         ))
         
         if len(display_df) > 20:
             print(f"\n... and {len(display_df) - 20} more customers")
     
-    def export_to_csv(self, output_dir='reports'):
+    def export_to_csv(self, output_dir=None):
         """Export reports to CSV files"""
-        import os
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Export customer metrics
-        self.metrics.to_csv(f'{output_dir}/customer_metrics.csv', index=False)
-        print(f"✓ Exported customer metrics to {output_dir}/customer_metrics.csv")
-        
-        # Export product risk
-        self.product_risk.to_csv(f'{output_dir}/product_risk_analysis.csv', index=False)
-        print(f"✓ Exported product risk analysis to {output_dir}/product_risk_analysis.csv")
-        
-        # Export retention strategies
-        self.strategies.to_csv(f'{output_dir}/retention_strategies.csv', index=False)
-        print(f"✓ Exported retention strategies to {output_dir}/retention_strategies.csv")
-        
-        return output_dir
+        out = self.out
+        if output_dir is not None and Path(output_dir) != out:
+            out = Path(output_dir)
+            out.mkdir(parents=True, exist_ok=True)
+        
+        exports = [
+            (self.metrics, 'customer_metrics.csv', 'customer metrics'),
+            (self.product_risk, 'product_risk_analysis.csv', 'product risk analysis'),
+            (self.strategies, 'retention_strategies.csv', 'retention strategies'),
+        ]
+        
+        # The three files are independent, so write them concurrently and report in order
+        with ThreadPoolExecutor(max_workers=len(exports)) as pool:
+            futures = [pool.submit(df.to_csv, out / name, index=False) for df, name, _ in exports]
+            for future, (_, name, label) in zip(futures, exports):
+                future.result()
+                print(f"✓ Exported {label} to {out / name}")
+        
+        return str(out)
     
     def export_to_json(self, output_file='churn_report.json'):
         """Export complete analysis to JSON"""
@@ -179,18 +224,15 @@ class ReportGenerator:
             'generated_at': datetime.now().isoformat(),
             'summary': {
                 'total_customers': len(self.metrics),
-                'high_risk_count': len(self.metrics[self.metrics['risk_level'] == 'High Risk']),
-                'medium_risk_count': len(self.metrics[self.metrics['risk_level'] == 'Medium Risk']),
+                'high_risk_count': self._risk_counts.get(RISK_HIGH, 0),
+                'medium_risk_count': self._risk_counts.get(RISK_MEDIUM, 0),
                 'avg_risk_score': float(self.metrics['churn_risk_score'].mean())
             },
-            'high_risk_customers': self.metrics[
-                self.metrics['risk_level'] == 'High Risk'
-            ].to_dict('records'),
+            'high_risk_customers': self._risk_group(RISK_HIGH).to_dict('records'),
             'retention_strategies': self.strategies.to_dict('records')
         }
         
-        with open(output_file, 'w') as f:
-            json.dump(report, f, indent=2, default=str)
+        write_json(report, output_file)
         
         print(f"✓ Exported complete report to {output_file}")
     
@@ -0,0 +1,53 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def report_dir(tmp_path, monkeypatch):
+    """Run the dashboard from a scratch copy so each test can supply its own report"""
+    for name in ('app.py', 'style.css'):
+        shutil.copy(REPO / name, tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write_report(report_dir, edit):
+    with open(REPO / 'churn_report.json') as f:
+        report = json.load(f)
+    edit(report['high_risk_customers'])
+    with open(report_dir / 'churn_report.json', 'w') as f:
+        json.dump(report, f)
+
+
+def open_analytics(risk_filter="All"):
+    at = AppTest.from_file('app.py', default_timeout=60).run()
+    at.selectbox[0].set_value(risk_filter).run()
+    at.radio[0].set_value("📊 Analytics").run()
+    return at
+
+
+def test_analytics_skips_null_risk_scores(report_dir):
+    def null_first_score(customers):
+        customers[0]['churn_risk_score'] = None
+    write_report(report_dir, null_first_score)
+
+    at = open_analytics()
+
+    assert not at.exception
+    assert not at.error
+
+
+def test_analytics_renders_empty_selection(report_dir):
+    write_report(report_dir, lambda customers: None)
+
+    # Every sample customer scores 70+, so the 50-70 band is empty
+    at = open_analytics("High (50-70)")
+
+    assert not at.exception
+    assert not at.error